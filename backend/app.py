@@ -1,21 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from datetime import datetime, timedelta
 from functools import wraps
+from cachetools import TLRUCache
+import threading
 import time
 import redis
-import json
+import orjson
 import os
 import re
 import jwt
+import numpy as np
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configure CORS with support for file:// origins and custom headers
 CORS(app, resources={
@@ -30,13 +43,21 @@ CORS(app, resources={
 })
 
 # Redis connection for session storage
+# One shared, bounded pool for sessions and rate limiting; callers wait up to
+# `timeout` seconds for a free connection instead of opening new ones.
+# The pool is per worker process: keep max_connections >= gunicorn --threads.
+# redis-py picks the C parser automatically when hiredis is installed.
+# Replies stay as bytes (no decode_responses): orjson parses bytes directly.
+redis_pool = redis.BlockingConnectionPool(
+    host=os.getenv('REDIS_HOST', 'localhost'),
+    port=int(os.getenv('REDIS_PORT', 6379)),
+    db=0,
+    max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 64)),
+    timeout=2
+)
+
 try:
-    redis_client = redis.Redis(
-        host=os.getenv('REDIS_HOST', 'localhost'),
-        port=int(os.getenv('REDIS_PORT', 6379)),
-        db=0,
-        decode_responses=True
-    )
+    redis_client = redis.Redis(connection_pool=redis_pool)
     # Test connection
     redis_client.ping()
     print("✅ Redis connection successful")
@@ -50,7 +71,10 @@ limiter = Limiter(
     app=app,
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri=f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}" if redis_client else "memory://"
+    storage_uri="redis://" if redis_client else "memory://",
+    storage_options={"connection_pool": redis_pool} if redis_client else {},
+    # Sliding window: limits' Redis storage does cleanup+count+insert in one Lua call
+    strategy="moving-window"
 )
 
 # API Key from environment
@@ -58,6 +82,18 @@ API_KEY = os.getenv('API_KEY', 'exitguard_demo_key_2026')
 
 # JWT Secret Key
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'exitguard_jwt_secret_2026_secure_key')
+JWT_ALGORITHM = 'HS256'
+JWT_ALGORITHMS = [JWT_ALGORITHM]
+TOKEN_TTL_SECONDS = 24 * 3600  # 24 hour expiration
+
+# Verified JWT payloads keyed by raw token; entries expire with the token itself
+JWT_CACHE_TTL = 3600  # Re-verify the signature at least once an hour
+_jwt_cache = TLRUCache(
+    maxsize=4096,
+    ttu=lambda _token, payload, now: min(payload['exp'], now + JWT_CACHE_TTL),
+    timer=time.time
+)
+_jwt_cache_lock = threading.Lock()
 
 # Demo users (hardcoded for demo purposes)
 DEMO_USERS = {
@@ -66,57 +102,464 @@ DEMO_USERS = {
     'demo': {'password': 'demo123', 'role': 'user'}
 }
 
+# Session IDs: 1-100 alphanumeric, hyphen or underscore characters
+SESSION_ID_RE = re.compile(r'\A[a-zA-Z0-9\-_]{1,100}\Z')
+
+# Behavior counters accepted from the tracking SDK - UPDATED to include mood-related fields
+VALID_BEHAVIORS = frozenset({
+    'rageClicks', 'deadClicks', 'hesitations', 'idleTime', 'scrollCount', 'mouseJiggles',
+    # NEW: Mood-related behaviors
+    'cartRevisits', 'itemAddRemoves', 'scrollDirectionChanges', 'mouseShakeIntensity',
+    'priceAreaTime', 'modalToggle', 'tabSwitches', 'mouseExitAttempts',
+    'addToCartActions', 'checkoutAttempts'
+})
+
+# Session storage settings
+SESSION_TTL = 300  # 5 minutes for live sessions
+CONVERSION_TTL = 3600  # Keep conversions for 1 hour (analytics)
+SESSION_INDEX_KEY = 'sessions:active'  # ZSET of session IDs scored by last_active (ms)
+SALVAGED_KEY = 'sessions:salvaged'  # ZSET of salvaged session IDs scored by order value
+CONVERTED_KEY = 'sessions:converted'  # ZSET of other converted session IDs scored by order value
+CONVERSION_TIMES_KEY = 'sessions:converted_at'  # ZSET of converted session IDs scored by conversion time (ms)
+MAX_SESSION_EVENTS = 200  # Raw events kept per session (events:<id> list)
+MAX_MOOD_HISTORY = 50  # Mood changes kept per session (moods:<id> list)
+SESSION_LIST_FIELDS = ('events', 'mood_history')  # Kept in their own lists, never in the blob
+
 # Fallback in-memory storage if Redis fails
 sessions_memory = {}
+events_memory = {}
+moods_memory = {}
+# Request threads share the fallback stores; hold this for every read-modify-write and snapshot
+_memory_lock = threading.Lock()
+
+# Shallow equality of two decoded JSON objects; anything that is not a table
+# (e.g. cjson.null from a JSON null) never compares equal
+LUA_SAME_TABLE = """
+local function same_table(a, b)
+    if type(a) ~= 'table' or type(b) ~= 'table' then
+        return false
+    end
+    for key, value in pairs(a) do
+        if b[key] ~= value then
+            return false
+        end
+    end
+    for key in pairs(b) do
+        if a[key] == nil then
+            return false
+        end
+    end
+    return true
+end
+"""
+
+# Atomic merge of a tracking update into a session blob (mirrors merge_tracking_update)
+# Raw events and mood changes go to bounded lists so the session blob stays small and
+# fixed-size. The blob is only rewritten when the update changes it; otherwise its TTL is
+# refreshed and the activity index alone records the new last_active.
+# Returns {changed (0/1), merged behaviors JSON} - behaviors are all scoring needs
+# KEYS[1] = session:<id>, KEYS[2] = session index, KEYS[3] = events:<id>, KEYS[4] = moods:<id>
+# ARGV = update JSON, default session JSON, ttl, session id, now (ms), index retention (ms),
+#        max events, max mood history, then one pre-serialized event per argument
+TRACK_LUA = LUA_SAME_TABLE + """
+-- cjson stores numbers with 14 significant digits; round incoming values the same way
+-- so a repeated fractional value compares equal to what was stored
+local function round14(value)
+    if type(value) == 'number' then
+        return tonumber(string.format('%.14g', value))
+    end
+    return value
+end
+
+local raw = redis.call('GET', KEYS[1])
+local update = cjson.decode(ARGV[1])
+update.mood_confidence = round14(update.mood_confidence)
+if type(update.mood_scores) == 'table' then
+    for key, value in pairs(update.mood_scores) do
+        update.mood_scores[key] = round14(value)
+    end
+end
+local s = cjson.decode(raw or ARGV[2])
+local changed = not raw
+
+s.last_active = update.timestamp
+-- Sessions written before events and mood history moved to their own lists;
+-- rewrite them so readers can splice the lists in without duplicating keys
+if s.events ~= nil or s.mood_history ~= nil then
+    changed = true
+end
+s.events = nil
+s.mood_history = nil
+if #ARGV > 8 then
+    for i = 9, #ARGV do
+        redis.call('RPUSH', KEYS[3], ARGV[i])
+    end
+    redis.call('LTRIM', KEYS[3], -tonumber(ARGV[7]), -1)
+end
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+
+-- Behavior counts are cumulative on the client, keep the highest seen
+for key, value in pairs(update.behaviors) do
+    value = round14(value)
+    local current = tonumber(s.behaviors[key]) or 0
+    if value > current then
+        changed = true
+    end
+    s.behaviors[key] = math.max(current, value)
+end
+
+if update.mood ~= s.mood or update.mood_confidence ~= s.mood_confidence
+        or not same_table(update.mood_scores, s.mood_scores) then
+    changed = true
+end
+
+if update.mood ~= 'neutral' and update.mood ~= (s.mood or 'neutral') then
+    redis.call('RPUSH', KEYS[4], cjson.encode({
+        mood = update.mood,
+        confidence = update.mood_confidence,
+        timestamp = update.timestamp
+    }))
+    redis.call('LTRIM', KEYS[4], -tonumber(ARGV[8]), -1)
+end
+redis.call('EXPIRE', KEYS[4], ARGV[3])
+s.mood = update.mood
+s.mood_scores = update.mood_scores
+s.mood_confidence = update.mood_confidence
+
+local now = tonumber(ARGV[5])
+if changed then
+    redis.call('SETEX', KEYS[1], ARGV[3], cjson.encode(s))
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+redis.call('ZADD', KEYS[2], 'GT', tonumber(s.last_active) or now, ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[6]))
+return {changed and 1 or 0, cjson.encode(s.behaviors)}
+"""
+
+# Drop conversions older than the retention window from the per-status revenue sets
+# KEYS = salvaged set, converted set, conversion times; ARGV[1] = cutoff (ms)
+PRUNE_CONVERSIONS_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+for _, session_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], session_id)
+    redis.call('ZREM', KEYS[2], session_id)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+return #expired
+"""
 
 # ============================================================================
 # REDIS HELPER FUNCTIONS
 # ============================================================================
 
-def store_session_redis(session_id, session_data):
-    """Store session in Redis with 5-minute expiry"""
+# Scripts are loaded lazily (EVALSHA with EVAL fallback) on first call
+track_script = redis_client.register_script(TRACK_LUA) if redis_client else None
+prune_conversions_script = redis_client.register_script(PRUNE_CONVERSIONS_LUA) if redis_client else None
+
+def new_session(session_id, timestamp):
+    """Default data for a session seen for the first time"""
+    return {
+        'session_id': session_id,
+        'start_time': timestamp,
+        'last_active': timestamp,
+        'behaviors': {
+            'rageClicks': 0,
+            'deadClicks': 0,
+            'idleTime': 0,
+            'hesitations': 0,
+            'scrollCount': 0,
+            'mouseJiggles': 0
+        },
+        'intervention_triggered': False,
+        'intervention_type': None,
+        'intervention_time': None,
+        'conversion_status': 'pending',
+        'order_value': 0,
+        'converted_at': None,
+        # NEW: Mood tracking fields
+        'mood': 'neutral',
+        'mood_scores': {},
+        'mood_confidence': 0
+    }
+
+def merge_tracking_update(session, update, mood_history):
+    """
+    Merge a tracking update into session data (in-memory mirror of TRACK_LUA)
+    Mood changes go to `mood_history`, kept outside the session like moods:<id> in Redis
+    """
+    timestamp = update['timestamp']
+    mood = update['mood']
+    
+    session['last_active'] = timestamp
+    
+    # Update behavior counts (cumulative)
+    for key, value in update['behaviors'].items():
+        session['behaviors'][key] = max(session['behaviors'].get(key, 0), value)
+    
+    # Mood changed - add to history
+    if mood != 'neutral' and mood != session.get('mood', 'neutral'):
+        mood_history.append({
+            'mood': mood,
+            'confidence': update['mood_confidence'],
+            'timestamp': timestamp
+        })
+        del mood_history[:-MAX_MOOD_HISTORY]
+    
+    session['mood'] = mood
+    session['mood_scores'] = update['mood_scores']
+    session['mood_confidence'] = update['mood_confidence']
+    return session
+
+def _memory_sessions(session_ids=None):
+    """Snapshot the fallback sessions (all, or the given IDs) so callers never iterate a live dict"""
+    with _memory_lock:
+        if session_ids is None:
+            return list(sessions_memory.values())
+        return [sessions_memory[sid] for sid in session_ids if sid in sessions_memory]
+
+def track_session_redis(session_id, update, events):
+    """
+    Atomically merge a tracking update into the stored session
+    Returns (changed, behaviors) - changed is False when the stored session was left as is
+    """
     try:
         if redis_client:
-            redis_client.setex(
-                f"session:{session_id}",
-                300,  # 5 minutes TTL
-                json.dumps(session_data)
+            changed, behaviors = track_script(
+                keys=[
+                    f"session:{session_id}",
+                    SESSION_INDEX_KEY,
+                    f"events:{session_id}",
+                    f"moods:{session_id}"
+                ],
+                args=[
+                    orjson.dumps(update),
+                    orjson.dumps(new_session(session_id, update['timestamp'])),
+                    SESSION_TTL,
+                    session_id,
+                    int(time.time() * 1000),
+                    CONVERSION_TTL * 1000,
+                    MAX_SESSION_EVENTS,
+                    MAX_MOOD_HISTORY,
+                    *(orjson.dumps(event) for event in events)
+                ]
             )
+            return bool(changed), orjson.loads(behaviors)
+    except redis.exceptions.ResponseError as e:
+        # The script itself failed (bad input); Redis is up, so falling back would split state
+        print(f"Error in tracking script: {e}")
+        raise
+    except Exception as e:
+        print(f"Error tracking session: {e}")
+    
+    # Fallback to memory
+    with _memory_lock:
+        session = sessions_memory.get(session_id) or new_session(session_id, update['timestamp'])
+        merge_tracking_update(session, update, moods_memory.setdefault(session_id, []))
+        sessions_memory[session_id] = session
+        session_events = events_memory.setdefault(session_id, [])
+        session_events.extend(events)
+        del session_events[:-MAX_SESSION_EVENTS]
+        return True, dict(session['behaviors'])
+
+def store_session_redis(session_id, session_data, ttl=SESSION_TTL):
+    """Store session in Redis with expiry and keep the activity index up to date"""
+    try:
+        if redis_client:
+            now_ms = int(time.time() * 1000)
+            last_active = session_data.get('last_active') or now_ms
+            
+            # One round-trip: write blob, index it, evict index entries past the longest TTL
+            blob = {k: v for k, v in session_data.items() if k not in SESSION_LIST_FIELDS}
+            
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(f"session:{session_id}", ttl, orjson.dumps(blob))
+            pipe.expire(f"events:{session_id}", ttl)
+            pipe.expire(f"moods:{session_id}", ttl)
+            pipe.zadd(SESSION_INDEX_KEY, {session_id: last_active}, gt=True)
+            pipe.zremrangebyscore(SESSION_INDEX_KEY, '-inf', now_ms - CONVERSION_TTL * 1000)
+            pipe.execute()
         else:
             # Fallback to memory
-            sessions_memory[session_id] = session_data
+            with _memory_lock:
+                sessions_memory[session_id] = session_data
     except Exception as e:
         print(f"Error storing session: {e}")
-        sessions_memory[session_id] = session_data
+        with _memory_lock:
+            sessions_memory[session_id] = session_data
 
 def get_session_redis(session_id):
     """Retrieve session from Redis"""
     try:
         if redis_client:
             data = redis_client.get(f"session:{session_id}")
-            return json.loads(data) if data else None
+            return orjson.loads(data) if data else None
         else:
+            with _memory_lock:
+                return sessions_memory.get(session_id)
+    except Exception as e:
+        print(f"Error retrieving session: {e}")
+        with _memory_lock:
             return sessions_memory.get(session_id)
+
+def get_session_json_redis(session_id):
+    """
+    Retrieve a session with its events and mood history as a ready-to-send JSON document,
+    without decoding the events and mood history
+    """
+    try:
+        if redis_client:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(f"session:{session_id}")
+            pipe.lrange(f"events:{session_id}", 0, -1)
+            pipe.lrange(f"moods:{session_id}", 0, -1)
+            pipe.zscore(SESSION_INDEX_KEY, session_id)
+            data, events, moods, last_active = pipe.execute()
+            if not data:
+                return None
+            session = orjson.loads(data)
+            # Unchanged tracking updates only touch the index, so it has the latest activity
+            if last_active is not None:
+                session['last_active'] = int(last_active)
+            # Blobs written before the lists moved out may still embed them
+            for field in SESSION_LIST_FIELDS:
+                session.pop(field, None)
+            # Risk fields are derived from the behaviors, never stored
+            session.update(risk_fields(session['behaviors']))
+            # Splice the stored lists into the session object
+            return (
+                orjson.dumps(session)[:-1] +
+                b',"events":[' + b','.join(events) + b']' +
+                b',"mood_history":[' + b','.join(moods) + b']}'
+            )
     except Exception as e:
         print(f"Error retrieving session: {e}")
-        return sessions_memory.get(session_id)
+    
+    with _memory_lock:
+        session = sessions_memory.get(session_id)
+        if not session:
+            return None
+        return orjson.dumps({
+            **session,
+            **risk_fields(session['behaviors']),
+            'events': events_memory.get(session_id, []),
+            'mood_history': moods_memory.get(session_id, [])
+        })
 
-def get_all_sessions_redis():
-    """Get all active sessions from Redis"""
+def get_sessions_redis(session_ids):
+    """Retrieve several sessions in one round-trip, skipping expired ones"""
     try:
         if redis_client:
-            keys = redis_client.keys("session:*")
+            if not session_ids:
+                return []
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.mget([f"session:{sid}" for sid in session_ids])
+            pipe.zmscore(SESSION_INDEX_KEY, session_ids)
+            raw, last_actives = pipe.execute()
             sessions = []
-            for key in keys:
-                data = redis_client.get(key)
+            for data, last_active in zip(raw, last_actives):
                 if data:
-                    sessions.append(json.loads(data))
+                    session = orjson.loads(data)
+                    # Same as get_all_sessions_redis: the index has the latest activity
+                    if last_active is not None:
+                        session['last_active'] = int(last_active)
+                    sessions.append(session)
             return sessions
         else:
-            return list(sessions_memory.values())
+            return _memory_sessions(session_ids)
+    except Exception as e:
+        print(f"Error retrieving sessions: {e}")
+        return _memory_sessions(session_ids)
+
+def get_all_sessions_redis(max_age=SESSION_TTL):
+    """Get sessions active within the last `max_age` seconds from Redis"""
+    try:
+        if redis_client:
+            cutoff_ms = int(time.time() * 1000) - max_age * 1000
+            indexed = redis_client.zrangebyscore(SESSION_INDEX_KEY, cutoff_ms, '+inf', withscores=True)
+            if not indexed:
+                return []
+            
+            # Single round-trip for all blobs; expired keys come back as None
+            raw = redis_client.mget([b"session:" + sid for sid, _ in indexed])
+            sessions = []
+            for (_, last_active), data in zip(indexed, raw):
+                if data:
+                    session = orjson.loads(data)
+                    # Unchanged tracking updates only touch the index, so it has the latest activity
+                    session['last_active'] = int(last_active)
+                    sessions.append(session)
+            return sessions
+        else:
+            return _memory_sessions()
     except Exception as e:
         print(f"Error retrieving all sessions: {e}")
-        return list(sessions_memory.values())
+        return _memory_sessions()
+
+def count_active_sessions_redis(max_age=SESSION_TTL):
+    """Count sessions active within the last `max_age` seconds without loading them"""
+    cutoff_ms = int(time.time() * 1000) - max_age * 1000
+    try:
+        if redis_client:
+            return redis_client.zcount(SESSION_INDEX_KEY, cutoff_ms, '+inf')
+    except Exception as e:
+        print(f"Error counting sessions: {e}")
+    return sum(1 for s in _memory_sessions() if s['last_active'] > cutoff_ms)
+
+def record_conversion_redis(session_id, conversion_status, order_value):
+    """Index a conversion by status with its order value as the score"""
+    try:
+        if redis_client:
+            now_ms = int(time.time() * 1000)
+            status_key, other_key = (
+                (SALVAGED_KEY, CONVERTED_KEY) if conversion_status == 'salvaged'
+                else (CONVERTED_KEY, SALVAGED_KEY)
+            )
+            
+            pipe = redis_client.pipeline(transaction=False)
+            prune_conversions_script(
+                keys=[SALVAGED_KEY, CONVERTED_KEY, CONVERSION_TIMES_KEY],
+                args=[now_ms - CONVERSION_TTL * 1000],
+                client=pipe
+            )
+            pipe.zadd(status_key, {session_id: float(order_value)})
+            pipe.zrem(other_key, session_id)
+            pipe.zadd(CONVERSION_TIMES_KEY, {session_id: now_ms})
+            pipe.execute()
+    except Exception as e:
+        print(f"Error indexing conversion: {e}")
+
+def get_conversions_redis():
+    """
+    Return (salvaged, converted) lists of (session_id, order_value) within the retention window
+    """
+    try:
+        if redis_client:
+            pipe = redis_client.pipeline(transaction=False)
+            prune_conversions_script(
+                keys=[SALVAGED_KEY, CONVERTED_KEY, CONVERSION_TIMES_KEY],
+                args=[int(time.time() * 1000) - CONVERSION_TTL * 1000],
+                client=pipe
+            )
+            pipe.zrange(SALVAGED_KEY, 0, -1, withscores=True)
+            pipe.zrange(CONVERTED_KEY, 0, -1, withscores=True)
+            _, salvaged, converted = pipe.execute()
+            return (
+                [(sid.decode(), order_value) for sid, order_value in salvaged],
+                [(sid.decode(), order_value) for sid, order_value in converted]
+            )
+    except Exception as e:
+        print(f"Error retrieving conversions: {e}")
+    
+    # Fallback to memory - single pass over all sessions
+    salvaged, converted = [], []
+    for session in _memory_sessions():
+        conversion_status = session.get('conversion_status')
+        if conversion_status == 'salvaged':
+            salvaged.append((session['session_id'], session.get('order_value', 0)))
+        elif conversion_status == 'converted':
+            converted.append((session['session_id'], session.get('order_value', 0)))
+    return salvaged, converted
 
 # ============================================================================
 # SECURITY MIDDLEWARE
@@ -146,14 +589,7 @@ def require_api_key(f):
 
 def validate_session_id(session_id):
     """Validate session ID format"""
-    if not session_id or not isinstance(session_id, str):
-        return False
-    if len(session_id) > 100:
-        return False
-    # Only allow alphanumeric, hyphens, and underscores
-    if not re.match(r'^[a-zA-Z0-9\-_]+$', session_id):
-        return False
-    return True
+    return isinstance(session_id, str) and SESSION_ID_RE.match(session_id) is not None
 
 def validate_behavior_data(data):
     """Validate incoming behavior tracking data"""
@@ -173,20 +609,18 @@ def validate_behavior_data(data):
     if not isinstance(behaviors, dict):
         return False, "Behaviors must be an object"
     
-    # Validate behavior counts - UPDATED to include mood-related fields
-    valid_behaviors = [
-        'rageClicks', 'deadClicks', 'hesitations', 'idleTime', 'scrollCount', 'mouseJiggles',
-        # NEW: Mood-related behaviors
-        'cartRevisits', 'itemAddRemoves', 'scrollDirectionChanges', 'mouseShakeIntensity',
-        'priceAreaTime', 'modalToggle', 'tabSwitches', 'mouseExitAttempts',
-        'addToCartActions', 'checkoutAttempts'
-    ]
+    # Validate behavior counts
     for key, value in behaviors.items():
-        if key not in valid_behaviors:
+        if key not in VALID_BEHAVIORS:
             return False, f"Unknown behavior type: {key}"
-        if not isinstance(value, (int, float)) or value < 0:
+        # bool is an int subclass, but true/false are not counts
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
             return False, f"Invalid value for {key}"
     
+    # Validate mood scores structure
+    if 'moodScores' in data and not isinstance(data['moodScores'], dict):
+        return False, "moodScores must be an object"
+    
     return True, None
 
 def require_jwt_token(f):
@@ -205,8 +639,19 @@ def require_jwt_token(f):
             # Extract token from "Bearer <token>"
             token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
             
-            # Verify and decode token
-            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+            # Verify and decode token (cached; invalid tokens are never cached).
+            # exp is required: it bounds the cache entry and is re-checked on every hit.
+            with _jwt_cache_lock:
+                payload = _jwt_cache.get(token)
+            
+            if payload is None:
+                payload = jwt.decode(
+                    token, JWT_SECRET_KEY, algorithms=JWT_ALGORITHMS, options={'require': ['exp']}
+                )
+                with _jwt_cache_lock:
+                    _jwt_cache[token] = payload
+            elif payload['exp'] <= time.time():
+                raise jwt.ExpiredSignatureError('Signature has expired')
             
             # Add user info to request context
             request.user = payload
@@ -238,87 +683,138 @@ def add_security_headers(response):
 # RISK CALCULATION ALGORITHMS
 # ============================================================================
 
+# Heuristic parameters shared by the scalar and batch scorers below
+
+# Thresholds that count as a clear frustration signal (reduced from 3/3/5/30/10)
+FRUSTRATION_THRESHOLDS = {
+    'rageClicks': 2,     # 2+ rapid clicks = frustration
+    'deadClicks': 2,     # 2+ dead clicks = UI confusion
+    'hesitations': 3,    # 3+ long hovers = indecision
+    'idleTime': 20,      # 20+ seconds idle = distraction
+    'mouseJiggles': 6    # 6+ jiggles = impatience
+}
+
+# Require at least 2 frustration signals for medium/high risk
+# This prevents false positives from single behaviors
+MIN_FRUSTRATION_SIGNALS = 2
+LOW_RISK_SIGNAL_SCORE = 10  # Per signal below the minimum
+LOW_RISK_CAP = 20  # Low risk (0-20)
+
+# Weights per behavior count (scrollCount excluded - scrolling is engagement, not frustration!)
+RISK_WEIGHTS = {
+    'rageClicks': 20,    # Increased - most reliable frustration signal
+    'deadClicks': 10,    # Decreased - can be accidental
+    'hesitations': 5,    # Decreased - normal behavior when reading
+    'mouseJiggles': 2    # Decreased - some fidgeting is normal
+}
+
+# Idle time contributes min(idleTime / 2, 15) * 2 - capped lower, reading is not frustration
+IDLE_DIVISOR = 2
+IDLE_CAP = 15
+IDLE_WEIGHT = 2
+
+# Root causes as (behavior, threshold, description), in bit order for the masks below
+ROOT_CAUSE_RULES = (
+    ('rageClicks', 2, "High frustration (rage clicks detected)"),
+    ('deadClicks', 2, "UI responsiveness issues (dead clicks)"),
+    ('idleTime', 15, "User confusion or distraction (extended idle)"),
+    ('hesitations', 3, "Purchase hesitation")
+)
+
+# ROOT_CAUSE_TABLE[mask] is the joined description for a root-cause bitmask
+ROOT_CAUSE_TABLE = tuple(
+    " + ".join(
+        description for bit, (_, _, description) in enumerate(ROOT_CAUSE_RULES) if mask & (1 << bit)
+    ) or "Normal user behavior"
+    for mask in range(1 << len(ROOT_CAUSE_RULES))
+)
+
+SCORED_BEHAVIORS = tuple(FRUSTRATION_THRESHOLDS)
+
 def calculate_churn_risk(behaviors):
     """
     Heuristic scoring algorithm to calculate churn risk (0-100)
     IMPROVED: Requires multiple frustration signals to avoid false positives
     """
-    rage_clicks = behaviors.get('rageClicks', 0)
-    dead_clicks = behaviors.get('deadClicks', 0)
-    idle_time = behaviors.get('idleTime', 0)
-    hesitations = behaviors.get('hesitations', 0)
-    scroll_count = behaviors.get('scrollCount', 0)
-    mouse_jiggles = behaviors.get('mouseJiggles', 0)
-    
-    # Count clear frustration signals with more sensitive thresholds
-    frustration_signals = 0
-    
-    if rage_clicks >= 2:  # 2+ rapid clicks = frustration (reduced from 3)
-        frustration_signals += 1
-    if dead_clicks >= 2:  # 2+ dead clicks = UI confusion (reduced from 3)
-        frustration_signals += 1
-    if hesitations >= 3:  # 3+ long hovers = indecision (reduced from 5)
-        frustration_signals += 1
-    if idle_time >= 20:  # 20+ seconds idle = distraction (reduced from 30)
-        frustration_signals += 1
-    if mouse_jiggles >= 6:  # 6+ jiggles = impatience (reduced from 10)
-        frustration_signals += 1
-    
-    # Require at least 2 frustration signals for medium/high risk
-    # This prevents false positives from single behaviors
-    if frustration_signals < 2:
-        return min(20, frustration_signals * 10)  # Low risk (0-20)
-    
-    # Calculate weighted score with improved weights
-    score = (
-        rage_clicks * 20 +       # Increased - most reliable frustration signal
-        dead_clicks * 10 +       # Decreased - can be accidental
-        hesitations * 5 +        # Decreased - normal behavior when reading
-        mouse_jiggles * 2 +      # Decreased - some fidgeting is normal
-        min(idle_time / 2, 15) * 2  # Capped lower - reading is not frustration
-        # Removed scroll_count - scrolling is engagement, not frustration!
+    frustration_signals = sum(
+        behaviors.get(key, 0) >= threshold for key, threshold in FRUSTRATION_THRESHOLDS.items()
     )
+    if frustration_signals < MIN_FRUSTRATION_SIGNALS:
+        return min(LOW_RISK_CAP, frustration_signals * LOW_RISK_SIGNAL_SCORE)
     
-    # Normalize to 0-100 scale
-    risk_score = min(100, int(score))
+    score = sum(behaviors.get(key, 0) * weight for key, weight in RISK_WEIGHTS.items())
+    score += min(behaviors.get('idleTime', 0) / IDLE_DIVISOR, IDLE_CAP) * IDLE_WEIGHT
     
-    return risk_score
+    # Normalize to 0-100 scale
+    return min(100, int(score))
 
 def identify_root_cause(behaviors):
     """
     Identify the primary cause of churn risk
     """
-    rage_clicks = behaviors.get('rageClicks', 0)
-    dead_clicks = behaviors.get('deadClicks', 0)
-    idle_time = behaviors.get('idleTime', 0)
-    hesitations = behaviors.get('hesitations', 0)
-    
-    causes = []
-    
-    if rage_clicks >= 2:
-        causes.append("High frustration (rage clicks detected)")
-    if dead_clicks >= 2:
-        causes.append("UI responsiveness issues (dead clicks)")
-    if idle_time >= 15:
-        causes.append("User confusion or distraction (extended idle)")
-    if hesitations >= 3:
-        causes.append("Purchase hesitation")
-    
-    if not causes:
-        return "Normal user behavior"
-    
-    return " + ".join(causes)
+    mask = 0
+    for bit, (key, threshold, _) in enumerate(ROOT_CAUSE_RULES):
+        if behaviors.get(key, 0) >= threshold:
+            mask |= 1 << bit
+    return ROOT_CAUSE_TABLE[mask]
+
+def behaviors_to_arrays(sessions):
+    """Convert a list of sessions into one NumPy array per scored behavior"""
+    return {
+        key: np.fromiter(
+            (s['behaviors'].get(key, 0) for s in sessions),
+            dtype=np.float64,
+            count=len(sessions)
+        )
+        for key in SCORED_BEHAVIORS
+    }
+
+def score_batch(b):
+    """
+    Vectorized calculate_churn_risk over arrays from behaviors_to_arrays
+    """
+    frustration_signals = sum(
+        (b[key] >= threshold).astype(np.int8) for key, threshold in FRUSTRATION_THRESHOLDS.items()
+    )
+    score = sum(b[key] * weight for key, weight in RISK_WEIGHTS.items())
+    score = score + np.minimum(b['idleTime'] / IDLE_DIVISOR, IDLE_CAP) * IDLE_WEIGHT
+    return np.where(
+        frustration_signals < MIN_FRUSTRATION_SIGNALS,
+        np.minimum(LOW_RISK_CAP, frustration_signals * LOW_RISK_SIGNAL_SCORE),
+        np.minimum(100, score)
+    ).astype(np.int32)
+
+def root_cause_batch(b):
+    """
+    Vectorized identify_root_cause; returns bitmasks to decode via ROOT_CAUSE_TABLE
+    """
+    return sum(
+        (b[key] >= threshold).astype(np.uint8) << bit
+        for bit, (key, threshold, _) in enumerate(ROOT_CAUSE_RULES)
+    )
+
+# Interventions by risk level: low (<30), medium (30-59), high (60+)
+INTERVENTIONS = (
+    "Monitor session - no intervention needed",
+    "Prepare proactive outreach - user showing mild frustration",
+    "IMMEDIATE INTERVENTION - Trigger discount popup or live chat"
+)
 
 def suggest_intervention(risk_score, root_cause):
     """
     Suggest appropriate intervention based on risk level
     """
-    if risk_score < 30:
-        return "Monitor session - no intervention needed"
-    elif risk_score < 60:
-        return "Prepare proactive outreach - user showing mild frustration"
-    else:
-        return "IMMEDIATE INTERVENTION - Trigger discount popup or live chat"
+    return INTERVENTIONS[(risk_score >= 30) + (risk_score >= 60)]
+
+def risk_fields(behaviors):
+    """Risk score, root cause and suggested action for a session's behaviors"""
+    risk_score = calculate_churn_risk(behaviors)
+    root_cause = identify_root_cause(behaviors)
+    return {
+        'risk_score': risk_score,
+        'root_cause': root_cause,
+        'suggested_action': suggest_intervention(risk_score, root_cause)
+    }
 
 # ============================================================================
 # AUTHENTICATION ENDPOINTS
@@ -331,7 +827,9 @@ def login():
     Login endpoint - authenticates user and returns JWT token
     """
     try:
-        data = request.json
+        data = request.get_json(cache=False, silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid JSON body'}), 400
         username = data.get('username')
         password = data.get('password')
         
@@ -346,15 +844,16 @@ def login():
         if username in DEMO_USERS and DEMO_USERS[username]['password'] == password:
             user_role = DEMO_USERS[username]['role']
             
-            # Generate JWT token
+            # Generate JWT token (integer epoch seconds for exp/iat)
+            now = int(time.time())
             payload = {
                 'username': username,
                 'role': user_role,
-                'exp': datetime.utcnow() + timedelta(hours=24),  # 24 hour expiration
-                'iat': datetime.utcnow()
+                'exp': now + TOKEN_TTL_SECONDS,
+                'iat': now
             }
             
-            token = jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
+            token = jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
             
             return jsonify({
                 'success': True,
@@ -383,7 +882,9 @@ def track_events():
     NOW INCLUDES: Customer mood detection data
     """
     try:
-        data = request.json
+        data = request.get_json(cache=False, silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid JSON body'}), 400
         
         # Validate input data
         is_valid, error_msg = validate_behavior_data(data)
@@ -395,92 +896,26 @@ def track_events():
             return jsonify({'error': error_msg}), 400
         
         session_id = data.get('session_id')
-        timestamp = data.get('timestamp')
         events = data.get('events', [])
-        behaviors = data.get('behaviors', {})
         
         # NEW: Mood detection data
-        mood = data.get('mood', 'neutral')
-        mood_scores = data.get('moodScores', {})
-        mood_confidence = data.get('moodConfidence', 0)
-        
-        # Get or create session data
-        session = get_session_redis(session_id)
-        
-        if not session:
-            session = {
-                'session_id': session_id,
-                'start_time': timestamp,
-                'last_active': timestamp,
-                'events': [],
-                'behaviors': {
-                    'rageClicks': 0,
-                    'deadClicks': 0,
-                    'idleTime': 0,
-                    'hesitations': 0,
-                    'scrollCount': 0,
-                    'mouseJiggles': 0
-                },
-                'risk_score': 0,
-                'root_cause': 'Normal user behavior',
-                'suggested_action': 'Monitor session',
-                'intervention_triggered': False,
-                'intervention_type': None,
-                'intervention_time': None,
-                'conversion_status': 'pending',
-                'order_value': 0,
-                'converted_at': None,
-                # NEW: Mood tracking fields
-                'mood': 'neutral',
-                'mood_scores': {},
-                'mood_confidence': 0,
-                'mood_history': []
-            }
-        
-        # Update session
-        session['last_active'] = timestamp
-        session['events'].extend(events)
-        
-        # Update behavior counts (cumulative)
-        for key, value in behaviors.items():
-            session['behaviors'][key] = max(session['behaviors'].get(key, 0), value)
+        update = {
+            'timestamp': data.get('timestamp'),
+            'behaviors': data.get('behaviors', {}),
+            'mood': data.get('mood', 'neutral'),
+            'mood_scores': data.get('moodScores', {}),
+            'mood_confidence': data.get('moodConfidence', 0)
+        }
+        mood = update['mood']
         
-        # NEW: Update mood data
-        if mood != 'neutral' and mood != session.get('mood', 'neutral'):
-            # Mood changed - add to history
-            if 'mood_history' not in session:
-                session['mood_history'] = []
-            
-            session['mood_history'].append({
-                'mood': mood,
-                'confidence': mood_confidence,
-                'timestamp': timestamp
-            })
-        
-        session['mood'] = mood
-        session['mood_scores'] = mood_scores
-        session['mood_confidence'] = mood_confidence
-        
-        # Calculate risk score
-        risk_score = calculate_churn_risk(session['behaviors'])
-        root_cause = identify_root_cause(session['behaviors'])
-        suggested_action = suggest_intervention(risk_score, root_cause)
-        
-        # Update session with scores
-        session['risk_score'] = risk_score
-        session['root_cause'] = root_cause
-        session['suggested_action'] = suggested_action
-        
-        # Store updated session in Redis
-        store_session_redis(session_id, session)
+        # Merge into the stored session in a single atomic step
+        _, behaviors = track_session_redis(session_id, update, events)
         
-        # Return response
+        # Return response - scores are computed from behaviors on read, not stored
         return jsonify({
             'success': True,
             'session_id': session_id,
-            'risk_score': risk_score,
-            'root_cause': root_cause,
-            'suggested_action': suggested_action,
+            **risk_fields(behaviors),
             'mood': mood  # Echo back mood
         })
     
@@ -502,34 +937,41 @@ def get_all_sessions():
         
         # Filter sessions active in last 5 minutes
         current_time = int(time.time() * 1000)
-        active_sessions = []
+        live_sessions = [s for s in all_sessions if (current_time - s['last_active']) / 1000 < 300]
         
-        for session in all_sessions:
-            last_active_seconds = (current_time - session['last_active']) / 1000
-            
-            # Only include sessions active in last 5 minutes
-            if last_active_seconds < 300:
-                active_sessions.append({
+        # Score all live sessions in one vectorized pass
+        behavior_arrays = behaviors_to_arrays(live_sessions)
+        risk_scores = score_batch(behavior_arrays)
+        root_cause_masks = root_cause_batch(behavior_arrays)
+        
+        # Sort by risk score descending (stable, like list.sort)
+        order = np.argsort(-risk_scores, kind='stable').tolist()
+        high_risk_count = int((risk_scores >= 60).sum())
+        risk_scores = risk_scores.tolist()
+        root_cause_masks = root_cause_masks.tolist()
+        
+        def generate():
+            # Encode one session at a time instead of building the whole response up front
+            yield b'{"sessions":['
+            for n, i in enumerate(order):
+                session = live_sessions[i]
+                risk_score = risk_scores[i]
+                root_cause = ROOT_CAUSE_TABLE[root_cause_masks[i]]
+                yield (b',' if n else b'') + orjson.dumps({
                     'session_id': session['session_id'],
-                    'risk_score': session['risk_score'],
-                    'root_cause': session['root_cause'],
-                    'suggested_action': session['suggested_action'],
-                    'last_active': f"{int(last_active_seconds)}s ago",
+                    'risk_score': risk_score,
+                    'root_cause': root_cause,
+                    'suggested_action': suggest_intervention(risk_score, root_cause),
+                    'last_active': f"{int((current_time - session['last_active']) / 1000)}s ago",
                     'behaviors': session['behaviors'],
                     # NEW: Mood data
                     'mood': session.get('mood', 'neutral'),
                     'mood_confidence': session.get('mood_confidence', 0),
                     'mood_scores': session.get('mood_scores', {})
                 })
+            yield b'],"total_sessions":%d,"high_risk_count":%d}' % (len(order), high_risk_count)
         
-        # Sort by risk score descending
-        active_sessions.sort(key=lambda x: x['risk_score'], reverse=True)
-        
-        return jsonify({
-            'sessions': active_sessions,
-            'total_sessions': len(active_sessions),
-            'high_risk_count': sum(1 for s in active_sessions if s['risk_score'] >= 60)
-        })
+        return Response(generate(), mimetype='application/json')
     
     except Exception as e:
         app.logger.error(f"Error in /api/sessions: {str(e)}")
@@ -546,11 +988,12 @@ def get_session(session_id):
         if not validate_session_id(session_id):
             return jsonify({'error': 'Invalid session ID format'}), 400
         
-        session = get_session_redis(session_id)
-        if not session:
+        # Stored blob is already JSON - send it as is
+        session_json = get_session_json_redis(session_id)
+        if not session_json:
             return jsonify({'error': 'Session not found'}), 404
         
-        return jsonify(session)
+        return Response(session_json, mimetype='application/json')
     
     except Exception as e:
         app.logger.error(f"Error in /api/session: {str(e)}")
@@ -564,7 +1007,9 @@ def mark_intervention():
     Mark that an intervention was triggered for a session
     """
     try:
-        data = request.json
+        data = request.get_json(cache=False, silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid JSON body'}), 400
         session_id = data.get('session_id')
         intervention_type = data.get('intervention_type', 'discount_popup')
         timestamp = data.get('timestamp')
@@ -602,7 +1047,9 @@ def record_conversion():
     Record a purchase/conversion and determine if it was salvaged
     """
     try:
-        data = request.json
+        data = request.get_json(cache=False, silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Invalid JSON body'}), 400
         session_id = data.get('session_id')
         order_value = data.get('order_value', 0)
         timestamp = data.get('timestamp')
@@ -617,7 +1064,7 @@ def record_conversion():
         
         # Determine if this is a salvaged conversion
         # SALVAGE CRITERIA: High risk (>=60) AND intervention was triggered
-        is_salvaged = (session['risk_score'] >= 60 and 
+        is_salvaged = (calculate_churn_risk(session['behaviors']) >= 60 and 
                       session['intervention_triggered'] == True)
         
         # Update session with conversion data
@@ -626,14 +1073,8 @@ def record_conversion():
         session['converted_at'] = timestamp
         
         # Store updated session with extended TTL (keep for analytics)
-        if redis_client:
-            redis_client.setex(
-                f"session:{session_id}",
-                3600,  # Keep conversions for 1 hour
-                json.dumps(session)
-            )
-        else:
-            sessions_memory[session_id] = session
+        store_session_redis(session_id, session, ttl=CONVERSION_TTL)
+        record_conversion_redis(session_id, session['conversion_status'], order_value)
         
         return jsonify({
             'success': True,
@@ -655,23 +1096,23 @@ def get_salvage_stats():
     CP6 INNOVATION: Tracks rescued customers and revenue saved
     """
     try:
-        all_sessions = get_all_sessions_redis()
+        # Conversion counts and revenue come straight from the per-status sets
+        salvaged, converted = get_conversions_redis()
         
-        # Filter for sessions with meaningful data
-        high_risk_sessions = [s for s in all_sessions if s.get('risk_score', 0) >= 60]
-        salvaged_sessions = [s for s in all_sessions if s.get('conversion_status') == 'salvaged']
-        converted_sessions = [s for s in all_sessions if s.get('conversion_status') in ['converted', 'salvaged']]
+        # Conversions outlive live sessions, so look back over the full conversion TTL
+        all_sessions = get_all_sessions_redis(max_age=CONVERSION_TTL)
+        risk_scores = score_batch(behaviors_to_arrays(all_sessions))
         
         # Calculate metrics
-        total_salvaged = len(salvaged_sessions)
-        total_high_risk = len(high_risk_sessions)
-        total_conversions = len(converted_sessions)
+        total_salvaged = len(salvaged)
+        total_high_risk = int((risk_scores >= 60).sum())
+        total_conversions = total_salvaged + len(converted)
         
         # Salvage Rate = High-risk conversions / Total high-risk sessions
         salvage_rate = (total_salvaged / total_high_risk) if total_high_risk > 0 else 0
         
         # Revenue Saved = Sum of all salvaged order values
-        revenue_saved = sum(s.get('order_value', 0) for s in salvaged_sessions)
+        revenue_saved = sum(order_value for _, order_value in salvaged)
         
         # Average salvage value
         avg_salvage_value = (revenue_saved / total_salvaged) if total_salvaged > 0 else 0
@@ -680,7 +1121,7 @@ def get_salvage_stats():
         intervention_success_rate = salvage_rate
         
         # Total revenue (all conversions)
-        total_revenue = sum(s.get('order_value', 0) for s in converted_sessions)
+        total_revenue = revenue_saved + sum(order_value for _, order_value in converted)
         
         return jsonify({
             'total_salvaged_customers': total_salvaged,
@@ -691,7 +1132,10 @@ def get_salvage_stats():
             'total_high_risk': total_high_risk,
             'total_conversions': total_conversions,
             'total_revenue': round(total_revenue, 2),
-            'salvaged_sessions': salvaged_sessions
+            'salvaged_sessions': [
+                {**session, **risk_fields(session['behaviors'])}
+                for session in get_sessions_redis([session_id for session_id, _ in salvaged])
+            ]
         })
     
     except Exception as e:
@@ -709,8 +1153,7 @@ def health_check():
         redis_status = 'connected' if redis_client and redis_client.ping() else 'disconnected'
         
         # Get active session count
-        all_sessions = get_all_sessions_redis()
-        active_count = len([s for s in all_sessions if (int(time.time() * 1000) - s['last_active']) / 1000 < 300])
+        active_count = count_active_sessions_redis()
         
         return jsonify({
             'status': 'healthy',
@@ -737,4 +1180,5 @@ if __name__ == '__main__':
     print("📊 Dashboard: Open dashboard.html in browser")
     print("🛒 Demo Store: Open demo-store.html in browser")
     print("="*60)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server only - production runs under gunicorn (see render.yaml)
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as exitguard  # noqa: E402
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point the app at an empty fakeredis server with the Lua scripts registered"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(exitguard, 'redis_client', client)
+    monkeypatch.setattr(exitguard, 'track_script', client.register_script(exitguard.TRACK_LUA))
+    monkeypatch.setattr(
+        exitguard, 'prune_conversions_script',
+        client.register_script(exitguard.PRUNE_CONVERSIONS_LUA)
+    )
+    monkeypatch.setattr(exitguard, 'sessions_memory', {})
+    monkeypatch.setattr(exitguard, 'events_memory', {})
+    monkeypatch.setattr(exitguard, 'moods_memory', {})
+    return client
+
+
+@pytest.fixture
+def client(fake_redis):
+    exitguard.limiter.enabled = False
+    exitguard.app.config['TESTING'] = True
+    with exitguard.app.test_client() as test_client:
+        yield test_client
+    exitguard.limiter.enabled = True
@@ -0,0 +1,100 @@
+import time
+
+import orjson
+
+import app as exitguard
+
+NOW = int(time.time() * 1000)
+
+
+def test_session_json_splices_lists(fake_redis):
+    exitguard.track_session_redis('s1', {
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': 1},
+        'mood': 'frustrated',
+        'mood_scores': {},
+        'mood_confidence': 0.9
+    }, [{'type': 'click'}])
+
+    session = orjson.loads(exitguard.get_session_json_redis('s1'))
+
+    assert session['behaviors']['rageClicks'] == 1
+    assert session['events'] == [{'type': 'click'}]
+    assert session['mood_history'] == [{'mood': 'frustrated', 'confidence': 0.9, 'timestamp': NOW}]
+
+
+def test_session_json_replaces_embedded_lists(fake_redis):
+    legacy = dict(exitguard.new_session('s1', NOW), events=[{'type': 'old'}], mood_history=[])
+    fake_redis.set('session:s1', orjson.dumps(legacy))
+    fake_redis.rpush('events:s1', orjson.dumps({'type': 'new'}))
+
+    raw = exitguard.get_session_json_redis('s1')
+
+    assert raw.count(b'"events"') == 1
+    assert raw.count(b'"mood_history"') == 1
+    session = orjson.loads(raw)
+    assert session['events'] == [{'type': 'new'}]
+    assert session['mood_history'] == []
+
+
+def test_store_session_keeps_lists_out_of_blob(fake_redis):
+    session = dict(exitguard.new_session('s1', NOW), events=[{'type': 'old'}], mood_history=[])
+
+    exitguard.store_session_redis('s1', session)
+
+    stored = orjson.loads(fake_redis.get('session:s1'))
+    assert 'events' not in stored
+    assert 'mood_history' not in stored
+    assert 'events' in session
+
+
+def test_readers_report_latest_activity(fake_redis):
+    update = {
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': 1},
+        'mood': 'neutral',
+        'mood_scores': {},
+        'mood_confidence': 0
+    }
+    exitguard.track_session_redis('s1', update, [])
+    changed, _ = exitguard.track_session_redis('s1', dict(update, timestamp=NOW + 5_000), [])
+    assert changed is False
+
+    assert orjson.loads(exitguard.get_session_json_redis('s1'))['last_active'] == NOW + 5_000
+    assert [s['last_active'] for s in exitguard.get_sessions_redis(['s1', 'gone'])] == [NOW + 5_000]
+
+
+def test_risk_fields_are_computed_not_stored(fake_redis):
+    update = {
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': 5, 'deadClicks': 3},
+        'mood': 'neutral',
+        'mood_scores': {},
+        'mood_confidence': 0
+    }
+    exitguard.track_session_redis('s1', update, [])
+
+    assert 'risk_score' not in orjson.loads(fake_redis.get('session:s1'))
+    session = orjson.loads(exitguard.get_session_json_redis('s1'))
+    assert session['risk_score'] == exitguard.calculate_churn_risk(session['behaviors'])
+    assert session['root_cause'] == exitguard.identify_root_cause(session['behaviors'])
+
+
+def test_convert_scores_stored_behaviors(client):
+    exitguard.track_session_redis('s1', {
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': 10, 'deadClicks': 10},
+        'mood': 'neutral',
+        'mood_scores': {},
+        'mood_confidence': 0
+    }, [])
+    client.post('/api/intervention', headers={'X-API-Key': exitguard.API_KEY}, json={'session_id': 's1'})
+
+    response = client.post('/api/convert', headers={'X-API-Key': exitguard.API_KEY}, json={
+        'session_id': 's1',
+        'order_value': 42
+    })
+
+    assert response.get_json()['salvaged'] is True
+    stats = exitguard.get_conversions_redis()
+    assert stats == ([('s1', 42.0)], [])
@@ -0,0 +1,148 @@
+import time
+
+import orjson
+import pytest
+import redis
+
+import app as exitguard
+
+API_HEADERS = {'X-API-Key': exitguard.API_KEY}
+NOW = int(time.time() * 1000)
+
+
+def make_update(timestamp=NOW, **behaviors):
+    return {
+        'timestamp': timestamp,
+        'behaviors': behaviors,
+        'mood': 'neutral',
+        'mood_scores': {'neutral': 1},
+        'mood_confidence': 0.5
+    }
+
+
+def stored_session(fake_redis, session_id):
+    return orjson.loads(fake_redis.get(f'session:{session_id}'))
+
+
+def test_first_update_creates_session(fake_redis):
+    changed, behaviors = exitguard.track_session_redis('s1', make_update(rageClicks=2), [])
+
+    assert changed is True
+    assert behaviors['rageClicks'] == 2
+    session = stored_session(fake_redis, 's1')
+    assert session['session_id'] == 's1'
+    assert session['behaviors']['rageClicks'] == 2
+    assert fake_redis.ttl('session:s1') > 0
+    assert fake_redis.zscore(exitguard.SESSION_INDEX_KEY, 's1') == NOW
+
+
+def test_behaviors_keep_highest_value(fake_redis):
+    exitguard.track_session_redis('s1', make_update(rageClicks=5), [])
+    changed, behaviors = exitguard.track_session_redis('s1', make_update(rageClicks=3), [])
+
+    assert changed is False
+    assert behaviors['rageClicks'] == 5
+    assert stored_session(fake_redis, 's1')['behaviors']['rageClicks'] == 5
+
+
+def test_repeated_update_leaves_blob_alone(fake_redis):
+    exitguard.track_session_redis('s1', make_update(NOW, rageClicks=1), [])
+    before = fake_redis.get('session:s1')
+
+    changed, _ = exitguard.track_session_redis('s1', make_update(NOW + 1_000, rageClicks=1), [])
+
+    assert changed is False
+    assert fake_redis.get('session:s1') == before
+    assert fake_redis.zscore(exitguard.SESSION_INDEX_KEY, 's1') == NOW + 1_000
+
+
+def test_events_and_mood_history_are_capped(fake_redis, monkeypatch):
+    monkeypatch.setattr(exitguard, 'MAX_SESSION_EVENTS', 3)
+    monkeypatch.setattr(exitguard, 'MAX_MOOD_HISTORY', 2)
+    for i, mood in enumerate(['frustrated', 'confused', 'frustrated']):
+        update = dict(make_update(NOW + i), mood=mood)
+        exitguard.track_session_redis('s1', update, [{'type': 'click', 'n': i}, {'type': 'scroll'}])
+
+    events = [orjson.loads(e) for e in fake_redis.lrange('events:s1', 0, -1)]
+    moods = [orjson.loads(m) for m in fake_redis.lrange('moods:s1', 0, -1)]
+    assert events == [{'type': 'scroll'}, {'type': 'click', 'n': 2}, {'type': 'scroll'}]
+    assert [m['mood'] for m in moods] == ['confused', 'frustrated']
+
+
+def test_legacy_null_mood_scores_count_as_changed(fake_redis):
+    legacy = dict(exitguard.new_session('s1', NOW), mood_scores=None)
+    fake_redis.set('session:s1', orjson.dumps(legacy))
+
+    changed, _ = exitguard.track_session_redis('s1', make_update(), [])
+
+    assert changed is True
+    assert stored_session(fake_redis, 's1')['mood_scores'] == {'neutral': 1}
+
+
+def test_script_error_is_raised_not_stored_in_memory(fake_redis):
+    with pytest.raises(redis.exceptions.ResponseError):
+        exitguard.track_session_redis('s1', make_update(rageClicks='many'), [])
+
+    assert exitguard.sessions_memory == {}
+
+
+def test_track_rejects_boolean_behaviors(client):
+    response = client.post('/api/track', headers=API_HEADERS, json={
+        'session_id': 's1',
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': True}
+    })
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid value for rageClicks'}
+
+
+def test_track_returns_500_on_script_error(client, monkeypatch):
+    def failing_script(*args, **kwargs):
+        raise redis.exceptions.ResponseError('user_script:1: boom')
+
+    monkeypatch.setattr(exitguard, 'track_script', failing_script)
+    response = client.post('/api/track', headers=API_HEADERS, json={
+        'session_id': 's1',
+        'timestamp': NOW,
+        'behaviors': {'rageClicks': 1}
+    })
+
+    assert response.status_code == 500
+    assert exitguard.sessions_memory == {}
+
+
+def test_repeated_fractional_counter_is_unchanged(fake_redis):
+    update = dict(make_update(priceAreaTime=7.579000000000001), mood_confidence=0.1 + 0.2)
+    exitguard.track_session_redis('s1', update, [])
+
+    changed, _ = exitguard.track_session_redis('s1', update, [])
+
+    assert changed is False
+
+
+def test_fractional_counter_matches_redis_precision(fake_redis):
+    # Real Redis cjson writes numbers with 14 significant digits
+    stored = exitguard.new_session('s1', NOW)
+    stored['behaviors']['priceAreaTime'] = 7.579
+    stored.update(mood_scores={'neutral': 1}, mood_confidence=0.3)
+    fake_redis.set('session:s1', orjson.dumps(stored))
+
+    update = dict(make_update(priceAreaTime=7.579000000000001), mood_confidence=0.1 + 0.2)
+    changed, _ = exitguard.track_session_redis('s1', update, [])
+
+    assert changed is False
+
+
+def test_legacy_embedded_lists_are_dropped_from_blob(fake_redis):
+    exitguard.track_session_redis('s1', make_update(), [])
+    legacy = dict(stored_session(fake_redis, 's1'), events=[{'type': 'old'}], mood_history=[])
+    fake_redis.set('session:s1', orjson.dumps(legacy))
+
+    changed, _ = exitguard.track_session_redis('s1', make_update(), [])
+
+    assert changed is True
+    session = stored_session(fake_redis, 's1')
+    assert 'events' not in session
+    assert 'mood_history' not in session
+